@@ -1,26 +1,107 @@
 import datetime
+import os
+import uuid
 import pytz
 ##import pytz
 
-from cs50 import SQL
+from cachelib import FileSystemCache
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool
 from flask import Flask, flash, redirect, render_template, request, session
-from flask_session import Session
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from functools import wraps
 
 app = Flask(__name__)
-app.secret_key = "super secret key"
+# The session lives in a signed cookie, so anyone holding this key can log in
+# as any user; it must come from the environment, never from the repo
+app.secret_key = os.environ["SECRET_KEY"]
 
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
 
-db = SQL("sqlite:///task.db")
+class Database:
+    """Minimal stand-in for cs50's SQL backed by a pooled SQLAlchemy engine"""
+
+    def __init__(self, url, **kwargs):
+        self.engine = create_engine(url, **kwargs)
+
+    def execute(self, sql, *args):
+        """Run one statement in its own transaction, binding args to its ? placeholders"""
+        with self.engine.begin() as connection:
+            result = connection.exec_driver_sql(sql, args)
+            if result.returns_rows:
+                return [dict(row) for row in result.mappings()]
+            return result.rowcount
+
+
+# SQLite defaults to opening a new connection per checkout for file databases;
+# keep a pool of them so each worker reuses connections and their pragmas
+db = Database(
+    "sqlite:///task.db",
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    connect_args={"check_same_thread": False, "timeout": 5},
+)
+
+# Let readers run alongside the single writer and wait out lock contention
+# instead of failing with "database is locked". WAL needs task.db on a real
+# file shared by all workers (gunicorn/uwsgi), not :memory:
+@event.listens_for(db.engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+# Every user's tasks live in one table, keyed by the owner's id
+db.execute("CREATE TABLE IF NOT EXISTS tasks (task_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, user_id INTEGER NOT NULL, task TEXT NOT NULL, status TEXT NOT NULL, time NUMERIC NOT NULL)")
+db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks (user_id, status)")
+
+# Older databases kept each user's tasks in a table named after the username;
+# move those rows into tasks once and drop the old table. BEGIN IMMEDIATE makes
+# workers starting together take turns, so each table is only copied once.
+# Only users that still have such a table are visited, so this is a single read
+# once every old table is gone
+legacy = db.execute("SELECT users.id, users.username FROM users JOIN sqlite_master ON sqlite_master.name = users.username WHERE sqlite_master.type = 'table' AND users.username NOT IN ('users', 'tasks', 'sqlite_sequence')")
+for user in legacy:
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",(user["username"],)).fetchone():
+            table = '"' + user["username"].replace('"', '""') + '"'
+            cursor.execute(f"INSERT INTO tasks (user_id,task,status,time) SELECT ?, task, status, time FROM {table}",(user["id"],))
+            cursor.execute(f"DROP TABLE {table}")
+        connection.commit()
+    finally:
+        connection.close()
+
+try:
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+except exc.IntegrityError:
+    # Existing duplicate usernames; register() still checks before inserting
+    app.logger.warning("users.username has duplicates, not creating idx_users_username")
+
+# Task lists are cached for 30 seconds in a directory shared by every worker.
+# Each user's cache keys include a version token that every write replaces, so
+# lists read before a write are never served or stored again after it.
+# cachelib unpickles whatever it finds there, so the directory must be private
+# to the app, never a shared location like /tmp
+cache_dir = os.environ.get("CACHE_DIR", os.path.join(app.instance_path, "cache"))
+os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+cache = FileSystemCache(cache_dir, default_timeout=30)
 
 @app.after_request
 def after_request(response):
-    """Ensure responses aren't cached"""
+    """Let browsers revalidate task lists with an ETag; ensure other responses aren't cached"""
+    if request.endpoint in ("index", "completed", "trash") and request.method == "GET" and response.status_code == 200:
+        response.headers["Cache-Control"] = "private, max-age=0, must-revalidate"
+        response.add_etag(weak=True)
+        return response.make_conditional(request)
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Expires"] = 0
     response.headers["Pragma"] = "no-cache"
@@ -36,24 +117,45 @@ def login_required(f):
 
     return decorated_function
 
-def get_name():
-    id = session["user_id"]
-    user = db.execute("SELECT * FROM users WHERE id = ?",id)[0]
-    name = user["username"]
-    return name
+def tasks_version(user_id):
+    """Return the token naming the user's current cached task lists"""
+    key = f"tasks_version:{user_id}"
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, timeout=0):
+            version = cache.get(key) or version
+    return version
+
+def load_tasks(user_id, status):
+    """Return the user's tasks with the given status, served from the cache when fresh"""
+    # Read the version before the rows so a concurrent write can only make this entry unreachable
+    key = f"tasks:{user_id}:{tasks_version(user_id)}:{status}"
+    tasks = cache.get(key)
+    if tasks is None:
+        if status == "TODO":
+            # ttime is the number of whole days since the task was added; time is stored as local time
+            tasks = db.execute("SELECT task_id, task, time, CAST(julianday('now', 'localtime') - julianday(time) AS INTEGER) AS ttime FROM tasks WHERE user_id = ? AND status = ?",user_id,status)
+        else:
+            tasks = db.execute("SELECT task_id, task, time FROM tasks WHERE user_id = ? AND status = ?",user_id,status)
+        cache.set(key, tasks)
+    return tasks
+
+def forget_tasks(user_id):
+    """Move the user to a new version so the next page load sees the change"""
+    cache.set(f"tasks_version:{user_id}", uuid.uuid4().hex, timeout=0)
+
+def set_status(user_id, task_ids, status, time):
+    """Move all selected tasks to status in a single UPDATE"""
+    placeholders = ",".join("?" * len(task_ids))
+    db.execute(f"UPDATE tasks SET status = ?, time = ? WHERE user_id = ? AND task_id IN ({placeholders})",status,time,user_id,*task_ids)
+    forget_tasks(user_id)
 
 
 @app.route("/")
 @login_required
 def index():
-    name = get_name()
-    time = datetime.datetime.now()
-    format = '%Y-%m-%d %H:%M:%S'
-    tasks = db.execute("SELECT * FROM ? WHERE status='TODO' GROUP BY task",name)
-    for a in range(len(tasks)):
-        ctime = datetime.datetime.strptime(tasks[a]["time"],format)
-        ctime = time - ctime
-        tasks[a]["ttime"] = int(ctime.total_seconds()//86400)
+    tasks = load_tasks(session["user_id"],"TODO")
     return render_template("index.html",tasks=tasks)
 
 @app.route("/login", methods=["GET", "POST"])
@@ -109,19 +211,20 @@ def register():
         if not (passw == request.form.get("confirmation")):
             flash("Password Is Different")
             return render_template("register.html")
-        names = db.execute("SELECT * FROM users")
-        for a in range(len(names)):
-            if name == names[a]["username"]:
-                flash("Username Already Chosen")
-                return render_template("register.html")
-            
-        db.execute(
-            "INSERT INTO users (username,hash) VALUES (?,?)",
-            name,
-            generate_password_hash(passw),
-        )
+        if db.execute("SELECT 1 FROM users WHERE username = ? LIMIT 1",name):
+            flash("Username Already Chosen")
+            return render_template("register.html")
 
-        db.execute( "CREATE TABLE IF NOT EXISTS ? (task_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE, task TEXT NOT NULL,status TEXT NOT NULL, time NUMERIC NOT NULL);",name,)
+        try:
+            db.execute(
+                "INSERT INTO users (username,hash) VALUES (?,?)",
+                name,
+                generate_password_hash(passw),
+            )
+        except exc.IntegrityError:
+            # Someone registered the same name since the check above
+            flash("Username Already Chosen")
+            return render_template("register.html")
         return redirect("/")
 
     else:
@@ -148,9 +251,10 @@ def add():
             flash("No Task Inputed")
             return redirect("/")
         
-        name = get_name()
-        time = datetime.datetime.now()
-        db.execute("INSERT INTO ? (task,status,time) VALUES (?,?,?)",name,task,"TODO",time)
+        user_id = session["user_id"]
+        time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        db.execute("INSERT INTO tasks (user_id,task,status,time) VALUES (?,?,?,?)",user_id,task,"TODO",time)
+        forget_tasks(user_id)
         return redirect("/")
     else:
         return redirect("/")
@@ -161,7 +265,7 @@ def action():
     if request.method == "GET":
         return redirect("/")
     else:
-        name = get_name()
+        user_id = session["user_id"]
     
         page_id = request.form.getlist("tasks")
         if not page_id:
@@ -171,11 +275,9 @@ def action():
         time = datetime.datetime.now()
         time = time.strftime('%m-%d-%Y')
         if request.form['action'] == "delete":
-            for a in page_id:
-                db.execute("UPDATE ? SET status = ?, time = ? WHERE task_id = ? ",name,"TRASH",time, a)
+            set_status(user_id,page_id,"TRASH",time)
         elif request.form['action'] == "finished":
-            for a in page_id:
-                db.execute("UPDATE ? SET status = ?, time = ? WHERE task_id = ? ",name,"COMPLETED",time, a)
+            set_status(user_id,page_id,"COMPLETED",time)
 
 
         return redirect("/")
@@ -184,12 +286,12 @@ def action():
 @app.route("/completed",methods=["GET","POST"])
 @login_required
 def completed():
-    name = get_name()
+    user_id = session["user_id"]
     time = datetime.datetime.now()
     time = time.strftime('%m-%d-%Y')
 
-    tasks = db.execute("SELECT * FROM ? WHERE status='COMPLETED' GROUP BY task",name)
     if request.method == "GET":
+        tasks = load_tasks(user_id,"COMPLETED")
         return render_template("completed.html",tasks=tasks)
     else:
         page_id = request.form.getlist("tasks")
@@ -198,8 +300,7 @@ def completed():
             return redirect("/completed")
         
         if request.form['action'] == "delete":
-            for a in page_id:
-                db.execute("UPDATE ? SET status = ?, time = ? WHERE task_id = ? ",name,"TRASH",time, a)
+            set_status(user_id,page_id,"TRASH",time)
 
         return redirect("/completed")
 
@@ -207,14 +308,15 @@ def completed():
 @app.route("/trash",methods=["GET","POST"])
 @login_required
 def trash():
-    name = get_name()
+    user_id = session["user_id"]
     time = datetime.datetime.now()
     time = time.strftime('%m-%d-%Y')
 
-    tasks = db.execute("SELECT * FROM ? WHERE status='TRASH' GROUP BY task",name)
     if request.method == "GET":
+        tasks = load_tasks(user_id,"TRASH")
         return render_template("trash.html",tasks=tasks)
     else:
         if request.form['action'] == "delete":
-            db.execute("DELETE FROM ? WHERE status = ?",name,"TRASH")
+            db.execute("DELETE FROM tasks WHERE user_id = ? AND status = ?",user_id,"TRASH")
+            forget_tasks(user_id)
         return redirect("/trash")
\ No newline at end of file
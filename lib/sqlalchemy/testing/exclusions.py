@@ -7,15 +7,25 @@
 
 
 import contextlib
+import itertools
 import operator
 import re
 import sys
+import weakref
 
 from . import config
 from .. import util
 from ..util import decorator
 from ..util.compat import inspect_getfullargspec
 
+if util.py2k:
+
+    def _ex_to_str(ex):
+        return unicode(ex).encode("utf-8", errors="ignore")  # noqa: F821
+
+else:
+    _ex_to_str = str
+
 
 def skip_if(predicate, reason=None):
     rule = compound()
@@ -32,13 +42,19 @@ def fails_if(predicate, reason=None):
 
 
 class compound(object):
+    __slots__ = ("fails", "skips", "tags")
+
     def __init__(self):
         self.fails = set()
         self.skips = set()
         self.tags = set()
 
     def __add__(self, other):
-        return self.add(other)
+        copy = compound()
+        copy.fails = self.fails | other.fails
+        copy.skips = self.skips | other.skips
+        copy.tags = self.tags | other.tags
+        return copy
 
     def as_skips(self):
         rule = compound()
@@ -48,6 +64,9 @@ class compound(object):
         return rule
 
     def add(self, *others):
+        if len(others) == 1:
+            return self + others[0]
+
         copy = compound()
         copy.fails.update(self.fails)
         copy.skips.update(self.skips)
@@ -70,7 +89,7 @@ class compound(object):
         return self.enabled_for_config(config._current)
 
     def enabled_for_config(self, config):
-        for predicate in self.skips.union(self.fails):
+        for predicate in itertools.chain(self.skips, self.fails):
             if predicate(config):
                 return False
         else:
@@ -79,7 +98,11 @@ class compound(object):
     def matching_config_reasons(self, config):
         return [
             predicate._as_string(config)
-            for predicate in self.skips.union(self.fails)
+            for predicate in itertools.chain(
+                self.skips,
+                # a predicate in both sets is reported once, as with a union
+                (fail for fail in self.fails if fail not in self.skips),
+            )
             if predicate(config)
         ]
 
@@ -139,16 +162,10 @@ class compound(object):
     def _expect_failure(self, config, ex, name="block"):
         for fail in self.fails:
             if fail(config):
-                if util.py2k:
-                    str_ex = unicode(ex).encode(  # noqa: F821
-                        "utf-8", errors="ignore"
-                    )
-                else:
-                    str_ex = str(ex)
                 print(
                     (
                         "%s failed as expected (%s): %s "
-                        % (name, fail._as_string(config), str_ex)
+                        % (name, fail._as_string(config), _ex_to_str(ex))
                     )
                 )
                 break
@@ -193,37 +210,27 @@ def succeeds_if(predicate, reason=None):
 
 
 class Predicate(object):
+    __slots__ = ("description",)
+
     @classmethod
     def as_predicate(cls, predicate, description=None):
-        if isinstance(predicate, compound):
+        # exact built-in types are the common case; look them up directly
+        # before walking the isinstance() checks
+        handler = _predicate_handlers.get(type(predicate))
+        if handler is not None:
+            return handler(predicate, description)
+        elif isinstance(predicate, compound):
             return cls.as_predicate(predicate.enabled_for_config, description)
         elif isinstance(predicate, Predicate):
             if description and predicate.description is None:
                 predicate.description = description
             return predicate
         elif isinstance(predicate, (list, set)):
-            return OrPredicate(
-                [cls.as_predicate(pred) for pred in predicate], description
-            )
+            return _predicate_from_sequence(predicate, description)
         elif isinstance(predicate, tuple):
-            return SpecPredicate(*predicate)
+            return _predicate_from_tuple(predicate, description)
         elif isinstance(predicate, util.string_types):
-            tokens = re.match(
-                r"([\+\w]+)\s*(?:(>=|==|!=|<=|<|>)\s*([\d\.]+))?", predicate
-            )
-            if not tokens:
-                raise ValueError(
-                    "Couldn't locate DB name in predicate: %r" % predicate
-                )
-            db = tokens.group(1)
-            op = tokens.group(2)
-            spec = (
-                tuple(int(d) for d in tokens.group(3).split("."))
-                if tokens.group(3)
-                else None
-            )
-
-            return SpecPredicate(db, op, spec, description=description)
+            return _predicate_from_string(predicate, description)
         elif callable(predicate):
             return LambdaPredicate(predicate, description)
         else:
@@ -249,6 +256,8 @@ class Predicate(object):
 
 
 class BooleanPredicate(Predicate):
+    __slots__ = ("value",)
+
     def __init__(self, value, description=None):
         self.value = value
         self.description = description or "boolean %s" % value
@@ -261,12 +270,21 @@ class BooleanPredicate(Predicate):
 
 
 class SpecPredicate(Predicate):
+    __slots__ = ("db", "op", "spec", "_oper")
+
     def __init__(self, db, op=None, spec=None, description=None):
         self.db = db
         self.op = op
         self.spec = spec
         self.description = description
 
+        # resolve the comparison once; predicates are evaluated far more
+        # often than they are constructed
+        if op is None or callable(op):
+            self._oper = op
+        else:
+            self._oper = self._ops[op]
+
     _ops = {
         "<": operator.lt,
         ">": operator.gt,
@@ -298,10 +316,7 @@ class SpecPredicate(Predicate):
             assert driver is None, "DBAPI version specs not supported yet"
 
             version = _server_version(engine)
-            oper = (
-                hasattr(self.op, "__call__") and self.op or self._ops[self.op]
-            )
-            return oper(version, self.spec)
+            return self._oper(version, self.spec)
         else:
             return True
 
@@ -321,6 +336,8 @@ class SpecPredicate(Predicate):
 
 
 class LambdaPredicate(Predicate):
+    __slots__ = ("lambda_", "args", "kw")
+
     def __init__(self, lambda_, description=None, args=None, kw=None):
         spec = inspect_getfullargspec(lambda_)
         if not spec[0]:
@@ -344,6 +361,8 @@ class LambdaPredicate(Predicate):
 
 
 class NotPredicate(Predicate):
+    __slots__ = ("predicate",)
+
     def __init__(self, predicate, description=None):
         self.predicate = predicate
         self.description = description
@@ -359,15 +378,14 @@ class NotPredicate(Predicate):
 
 
 class OrPredicate(Predicate):
+    __slots__ = ("predicates",)
+
     def __init__(self, predicates, description=None):
-        self.predicates = predicates
+        self.predicates = tuple(predicates)
         self.description = description
 
     def __call__(self, config):
-        for pred in self.predicates:
-            if pred(config):
-                return True
-        return False
+        return any(pred(config) for pred in self.predicates)
 
     def _eval_str(self, config, negate=False):
         if negate:
@@ -396,20 +414,93 @@ class OrPredicate(Predicate):
 
 _as_predicate = Predicate.as_predicate
 
+_spec_re = re.compile(r"([\+\w]+)\s*(?:(>=|==|!=|<=|<|>)\s*([\d\.]+))?")
+
+_parsed_specs = {}
+
+
+def _parse_spec(predicate):
+    """Parse a string such as ``"postgresql>=10"`` into (db, op, spec).
+
+    The same handful of strings are parsed for many tests, so results are
+    memoized; a new :class:`.SpecPredicate` is still built on each call as
+    its description may be assigned later.
+
+    """
+    try:
+        return _parsed_specs[predicate]
+    except KeyError:
+        pass
+
+    tokens = _spec_re.match(predicate)
+    if not tokens:
+        raise ValueError(
+            "Couldn't locate DB name in predicate: %r" % predicate
+        )
+    db = tokens.group(1)
+    op = tokens.group(2)
+    spec = (
+        tuple(int(d) for d in tokens.group(3).split("."))
+        if tokens.group(3)
+        else None
+    )
+
+    _parsed_specs[predicate] = parsed = (db, op, spec)
+    return parsed
+
+
+def _predicate_from_sequence(predicate, description):
+    return OrPredicate(
+        [Predicate.as_predicate(pred) for pred in predicate], description
+    )
+
+
+def _predicate_from_tuple(predicate, description):
+    return SpecPredicate(*predicate)
+
+
+def _predicate_from_string(predicate, description):
+    db, op, spec = _parse_spec(predicate)
+    return SpecPredicate(db, op, spec, description=description)
+
+
+_predicate_handlers = {
+    list: _predicate_from_sequence,
+    set: _predicate_from_sequence,
+    tuple: _predicate_from_tuple,
+}
+_predicate_handlers.update(
+    dict.fromkeys(util.string_types, _predicate_from_string)
+)
+
 
 def _is_excluded(db, op, spec):
     return SpecPredicate(db, op, spec)(config._current)
 
 
+_server_versions = weakref.WeakKeyDictionary()
+
+
 def _server_version(engine):
-    """Return a server_version_info tuple."""
+    """Return a server_version_info tuple.
+
+    The result is cached per engine, as it's consulted each time a
+    version-based predicate is evaluated.
+
+    """
+    try:
+        return _server_versions[engine]
+    except KeyError:
+        pass
 
-    # force metadata to be retrieved
-    conn = engine.connect()
+    # the dialect records the version on first connect; only connect
+    # here if that hasn't happened yet
     version = getattr(engine.dialect, "server_version_info", None)
-    if version is None:
-        version = ()
-    conn.close()
+    if not version:
+        with engine.connect():
+            pass
+        version = getattr(engine.dialect, "server_version_info", None) or ()
+    _server_versions[engine] = version
     return version
 
 